@@ -2,15 +2,20 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, HTMLResponse
 from pydantic import BaseModel
-import pandas as pd
 import numpy as np
+import orjson
 import joblib
 import logging
+import asyncio
 from datetime import datetime
 from typing import List, Optional, Dict
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from .utils import mock_genre_scores
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -22,7 +27,8 @@ app = FastAPI(
     description="AI-powered multi-label music genre classification system",
     version="2.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS
@@ -37,20 +43,44 @@ app.add_middleware(
 # Ensure directories exist
 os.makedirs("frontend/static", exist_ok=True)
 os.makedirs("frontend/templates", exist_ok=True)
-os.makedirs("models", exist_ok=True)
 
 # Mount static and templates
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 templates = Jinja2Templates(directory="frontend/templates")
 
 # Models and preprocessing
-MODEL = 'backend/models/svm_model.pkl'
-SCALER ='backend/models/svm_model.pkl'
+MODEL_PATH = os.environ.get("MODEL_PATH", "backend/models/svm_model.pkl")
+SCALER_PATH = os.environ.get("SCALER_PATH", "backend/models/scaler.pkl")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1))
+MODEL = None
+SCALER = None
 
 GENRE_LABELS = [
     "pop", "rock", "hip_hop", "jazz", "electronic",
     "classical", "r_b", "country", "metal", "folk"
 ]
+GENRE_LABELS_ARR = np.array(GENRE_LABELS, dtype=object)
+
+# Audio features in the order expected by the model
+FEATURE_NAMES = [
+    "danceability", "energy", "loudness", "speechiness", "acousticness",
+    "instrumentalness", "liveness", "valence", "tempo", "popularity"
+]
+
+# Response timestamp, refreshed once per second by a background task
+_NOW = datetime.now().isoformat()
+_TICK_TASK = None
+
+# Dynamic batching of concurrent /api/predict requests
+MAX_BATCH = 32
+BATCH_WINDOW = 0.005  # seconds
+_SCHEDULER_TASK = None
+_DISPATCH_TASKS = set()
+
+# LRU cache of genre probabilities keyed by rounded feature tuples
+CACHE_SIZE = 4096
+CACHE_DECIMALS = 3
+_PREDICTION_CACHE = OrderedDict()
 
 
 # Pydantic schemas
@@ -70,6 +100,9 @@ class TrackData(BaseModel):
     popularity: float = 50.0
 
 
+FEATURE_DEFAULTS = [TrackData.model_fields[name].default for name in FEATURE_NAMES]
+
+
 class PredictionResponse(BaseModel):
     track: str
     artists: str
@@ -90,39 +123,216 @@ class BatchPredictionResponse(BaseModel):
     average_confidence: float
 
 
-@app.on_event("startup")
-async def startup_event():
+async def _tick():
+    """Refresh the cached response timestamp every second"""
+    global _NOW
+    while True:
+        _NOW = datetime.now().isoformat()
+        await asyncio.sleep(1)
+
+
+def _load_artifact(path: str, name: str):
+    """Load a joblib artifact, or None if it is missing or unreadable"""
+    if not os.path.exists(path):
+        logger.warning("⚠️ %s not found at %s", name, path)
+        return None
+    try:
+        # No mmap_mode: libsvm rejects read-only support vector arrays
+        artifact = joblib.load(path)
+        logger.info("✅ %s loaded from %s", name, path)
+        return artifact
+    except Exception as e:
+        logger.error("❌ Error loading %s from %s: %s", name, path, e)
+        return None
+
+
+def _load_model():
+    """Load the SVM model and scaler into this process"""
     global MODEL, SCALER
+    _PREDICTION_CACHE.clear()
+    MODEL = _load_artifact(MODEL_PATH, "SVM model")
+    if MODEL is None:
+        logger.warning("⚠️ Running in demo mode")
+    SCALER = _load_artifact(SCALER_PATH, "Scaler")
+    if SCALER is None:
+        logger.warning("⚠️ Using default scaling")
+
+
+# Load at import time so gunicorn's preload_app loads the model once in the
+# master, forked workers then share its pages copy-on-write
+_load_model()
+
+
+def _load_model_in_worker():
+    """Process pool initializer, forked workers inherit the model so only spawned ones load it"""
+    if MODEL is None:
+        _load_model()
+
+
+def _to_genre_matrix(probabilities, n_rows: int) -> np.ndarray:
+    """Convert predict_proba output to an (n_rows, len(GENRE_LABELS)) matrix"""
+    # Multi-output classifiers return one (N, 2) array per genre
+    if isinstance(probabilities, list):
+        probabilities = np.column_stack([prob[:, 1] for prob in probabilities])
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+
+    # One column per genre, missing genres get 0.0
+    matrix = np.zeros((n_rows, len(GENRE_LABELS)))
+    n_cols = min(probabilities.shape[1], len(GENRE_LABELS))
+    matrix[:, :n_cols] = probabilities[:, :n_cols]
+    return matrix
+
+
+def _score_features(features_array: np.ndarray) -> np.ndarray:
+    """Scale and score an (N, 10) feature matrix inside an inference worker, returning (N, 10) probabilities"""
+    if SCALER is not None:
+        features_array = SCALER.transform(features_array)
+    return _to_genre_matrix(MODEL.predict_proba(features_array), len(features_array))
+
+
+def _start_pool() -> ProcessPoolExecutor:
+    """Start the inference process pool"""
+    return ProcessPoolExecutor(
+        max_workers=INFERENCE_WORKERS,
+        initializer=_load_model_in_worker
+    )
+
+
+async def _run_inference(features_array: np.ndarray) -> np.ndarray:
+    """Offload CPU-bound inference to the process pool, keeping the event loop free"""
+    loop = asyncio.get_running_loop()
+    pool = app.state.pool
     try:
-        if os.path.exists('backend/models/svm_model.pkl'):
-            MODEL = joblib.load('backend/models/svm_model.pkl')
-            logger.info("✅ SVM model loaded successfully")
-        else:
-            logger.warning("⚠️ Model file not found, running in demo mode")
+        return await loop.run_in_executor(pool, _score_features, features_array)
+    except BrokenProcessPool:
+        # An inference process died (OOM kill, crash in the model). The pool
+        # never recovers on its own, so replace it once and retry.
+        if app.state.pool is pool:
+            logger.error("❌ Inference pool broken, restarting it")
+            pool.shutdown(wait=False, cancel_futures=True)
+            app.state.pool = _start_pool()
 
-        if os.path.exists('models/scaler.pkl'):
-            SCALER = joblib.load('models/scaler.pkl')
-            logger.info("✅ Scaler loaded successfully")
-        else:
-            logger.warning("⚠️ Scaler not found, using default scaling")
+    try:
+        return await loop.run_in_executor(app.state.pool, _score_features, features_array)
+    except BrokenProcessPool:
+        raise HTTPException(status_code=503, detail="Inference workers unavailable")
+
+
+async def _dispatch_batch(batch):
+    """Run one coalesced batch and resolve the futures of its requests"""
+    features_matrix = np.vstack([features for features, _ in batch])
+    try:
+        probabilities = await _run_inference(features_matrix)
     except Exception as e:
-        logger.error(f"❌ Error loading model: {e}")
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+    else:
+        for (_, future), row in zip(batch, probabilities):
+            if not future.done():
+                future.set_result(row)
+
+
+async def _batch_scheduler():
+    """Collect up to MAX_BATCH queued requests within BATCH_WINDOW and dispatch them together"""
+    loop = asyncio.get_running_loop()
+    queue = app.state.predict_queue
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Keep collecting while this batch is in flight
+        task = asyncio.create_task(_dispatch_batch(batch))
+        _DISPATCH_TASKS.add(task)
+        task.add_done_callback(_DISPATCH_TASKS.discard)
+
+
+def _cache_get(key: tuple) -> Optional[np.ndarray]:
+    """Return cached probabilities for a feature tuple, marking it recently used"""
+    probabilities = _PREDICTION_CACHE.get(key)
+    if probabilities is not None:
+        _PREDICTION_CACHE.move_to_end(key)
+    return probabilities
+
+
+def _cache_put(key: tuple, probabilities: np.ndarray):
+    """Cache probabilities for a feature tuple, evicting the least recently used entry"""
+    probabilities.flags.writeable = False
+    _PREDICTION_CACHE[key] = probabilities
+    if len(_PREDICTION_CACHE) > CACHE_SIZE:
+        _PREDICTION_CACHE.popitem(last=False)
+
+
+def _build_responses(tracks: List[TrackData], probabilities: np.ndarray) -> List[PredictionResponse]:
+    """Build one PredictionResponse per track from an (N, 10) probability matrix"""
+    # Fields are produced here from validated input, so skip re-validation
+    top_mask = probabilities > 0.5
+    return [
+        PredictionResponse.model_construct(
+            track=track.track_name,
+            artists=track.artists,
+            predictions=dict(zip(GENRE_LABELS, row)),
+            top_genres=GENRE_LABELS_ARR[mask].tolist(),
+            confidence=sum(row) / len(GENRE_LABELS),
+            model_version="SVM-v2.0",
+            timestamp=_NOW
+        )
+        for track, row, mask in zip(tracks, probabilities.tolist(), top_mask)
+    ]
+
+
+async def _predict_batched(features_array: np.ndarray) -> np.ndarray:
+    """Queue a (1, 10) feature array for the batch scheduler and await its probability row"""
+    future = asyncio.get_running_loop().create_future()
+    await app.state.predict_queue.put((features_array, future))
+    return await future
+
+
+@app.on_event("startup")
+async def startup_event():
+    global _TICK_TASK, _SCHEDULER_TASK
+    _TICK_TASK = asyncio.create_task(_tick())
+    # Demo mode never runs inference, so only start workers for a real model
+    app.state.pool = _start_pool() if MODEL is not None else None
+    app.state.predict_queue = asyncio.Queue()
+    _SCHEDULER_TASK = asyncio.create_task(_batch_scheduler())
+
+    # Frontend pages have no per-request context, render them once
+    app.state.cached_pages = {
+        page: templates.get_template(f"{page}.html").render().encode("utf-8")
+        for page in ("index", "recommend", "admin")
+    }
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    _TICK_TASK.cancel()
+    _SCHEDULER_TASK.cancel()
+    if app.state.pool is not None:
+        app.state.pool.shutdown(cancel_futures=True)
 
 
 # Frontend routes
 @app.get("/")
-async def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+async def index():
+    return HTMLResponse(app.state.cached_pages["index"])
 
 
 @app.get("/recommend")
-async def recommend(request: Request):
-    return templates.TemplateResponse("recommend.html", {"request": request})
+async def recommend():
+    return HTMLResponse(app.state.cached_pages["recommend"])
 
 
 @app.get("/admin")
-async def admin(request: Request):
-    return templates.TemplateResponse("admin.html", {"request": request})
+async def admin():
+    return HTMLResponse(app.state.cached_pages["admin"])
 
 
 # API endpoints
@@ -131,7 +341,7 @@ async def health_check():
     return {
         "status": "healthy",
         "model_loaded": MODEL is not None,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": _NOW,
         "version": "2.0.0"
     }
 
@@ -148,112 +358,164 @@ async def predict_genres(track_data: TrackData):
         return await demo_predict(track_data)
 
     try:
-        # Prepare features for prediction
-        features = [
-            track_data.danceability,
-            track_data.energy,
-            track_data.loudness,
-            track_data.speechiness,
-            track_data.acousticness,
-            track_data.instrumentalness,
-            track_data.liveness,
-            track_data.valence,
-            track_data.tempo,
-            track_data.popularity
-        ]
-
-        # Make prediction
-        features_array = np.array(features).reshape(1, -1)
-        probabilities = MODEL.predict_proba(features_array)
-
-        # Handle different probability formats
-        if hasattr(probabilities, '__len__') and len(probabilities) > 0:
-            if isinstance(probabilities[0], np.ndarray):
-                probabilities = np.array([prob[1] for prob in probabilities])
-            else:
-                probabilities = probabilities[0]
-        else:
-            probabilities = np.random.rand(len(GENRE_LABELS))
-
-        # Create predictions dictionary
-        predictions = {}
-        for i, genre in enumerate(GENRE_LABELS):
-            if i < len(probabilities):
-                predictions[genre] = float(probabilities[i])
-            else:
-                predictions[genre] = 0.0
-
-        # Get top genres (above 0.5 confidence)
-        top_genres = [genre for genre, prob in predictions.items() if prob > 0.5]
-        confidence = np.mean(list(predictions.values()))
-
-        return PredictionResponse(
-            track=track_data.track_name,
-            artists=track_data.artists,
-            predictions=predictions,
-            top_genres=top_genres,
-            confidence=confidence,
-            model_version="SVM-v2.0",
-            timestamp=datetime.now().isoformat()
+        # Each queued request needs its own array, the scheduler stacks them later
+        features_array = np.array(
+            [[getattr(track_data, name) for name in FEATURE_NAMES]], dtype=np.float64
         )
-    except Exception as e:
-        logger.error(f"Prediction error: {e}")
+        # Only the cache key is rounded, the model scores the raw features
+        # exactly as /batch and /jsonl do
+        cache_key = tuple(np.round(features_array[0], CACHE_DECIMALS).tolist())
+
+        probabilities = _cache_get(cache_key)
+        if probabilities is None:
+            probabilities = await _predict_batched(features_array)
+            _cache_put(cache_key, probabilities)
+
+        return _build_responses([track_data], probabilities[np.newaxis])[0]
+    except (ValueError, AttributeError) as e:
+        logger.error("Prediction error: %s", e)
         # Fallback to demo mode
         return await demo_predict(track_data)
 
 
 async def demo_predict(track_data: TrackData):
     """Demo prediction when model is not available"""
-    # Generate mock probabilities based on input features
-    base_probs = {
-        "pop": min(0.7, track_data.danceability * 0.8 + track_data.popularity * 0.002),
-        "rock": min(0.6, track_data.energy * 0.7 + (1 - track_data.danceability) * 0.3),
-        "hip_hop": min(0.5, track_data.speechiness * 5 + track_data.energy * 0.3),
-        "jazz": min(0.4, track_data.acousticness * 0.6 + (1 - track_data.energy) * 0.2),
-        "electronic": min(0.8, track_data.energy * 0.7 + track_data.danceability * 0.5),
-        "classical": min(0.3, track_data.instrumentalness * 0.8 + track_data.acousticness * 0.4),
-        "r_b": min(0.5, track_data.danceability * 0.6 + track_data.valence * 0.3),
-        "country": min(0.4, track_data.acousticness * 0.5 + track_data.valence * 0.3),
-        "metal": min(0.3, track_data.energy * 0.8 + (1 - track_data.valence) * 0.2),
-        "folk": min(0.3, track_data.acousticness * 0.7 + (1 - track_data.energy) * 0.2)
-    }
-
-    # Normalize probabilities
-    total = sum(base_probs.values())
-    predictions = {genre: prob / total * 0.8 for genre, prob in base_probs.items()}
+    # Generate normalized mock probabilities based on input features
+    probs = mock_genre_scores(
+        np.array([getattr(track_data, name) for name in FEATURE_NAMES], dtype=np.float64)
+    )
+    predictions = dict(zip(GENRE_LABELS, probs.tolist()))
 
-    top_genres = [g for g, p in predictions.items() if p > 0.5]
-    confidence = np.mean(list(predictions.values()))
+    top_genres = GENRE_LABELS_ARR[probs > 0.5].tolist()
+    confidence = sum(predictions.values()) / len(GENRE_LABELS)
 
-    return PredictionResponse(
+    return PredictionResponse.model_construct(
         track=track_data.track_name,
         artists=track_data.artists,
         predictions=predictions,
         top_genres=top_genres,
         confidence=confidence,
         model_version="DEMO-MODE",
-        timestamp=datetime.now().isoformat()
+        timestamp=_NOW
     )
 
 
-@app.post("/api/predict/batch", response_model=BatchPredictionResponse)
-async def predict_genres_batch(batch_request: BatchPredictionRequest):
-    predictions = []
-    total_confidence = 0.0
+async def _predict_matrix(tracks: List[TrackData]) -> np.ndarray:
+    """Predict genre probabilities for all tracks with a single model call"""
+    features_matrix = np.array(
+        [[getattr(track, name) for name in FEATURE_NAMES] for track in tracks],
+        dtype=np.float64
+    )
+    return await _run_inference(features_matrix)
 
-    for track in batch_request.tracks:
-        resp = await predict_genres(track)
-        predictions.append(resp)
-        total_confidence += resp.confidence
 
-    avg_confidence = total_confidence / len(predictions) if predictions else 0.0
-    return BatchPredictionResponse(
+@app.post("/api/predict/batch", response_model=BatchPredictionResponse)
+async def predict_genres_batch(batch_request: BatchPredictionRequest):
+    tracks = batch_request.tracks
+    if not tracks:
+        return BatchPredictionResponse.model_construct(predictions=[], total_tracks=0, average_confidence=0.0)
+
+    probabilities = None
+    if MODEL is not None:
+        try:
+            probabilities = await _predict_matrix(tracks)
+        except (ValueError, AttributeError) as e:
+            logger.error("Batch prediction error: %s", e)
+
+    if probabilities is None:
+        # Demo mode, or fallback after a model error
+        predictions = [await demo_predict(track) for track in tracks]
+    else:
+        predictions = _build_responses(tracks, probabilities)
+
+    avg_confidence = sum(p.confidence for p in predictions) / len(predictions)
+    return BatchPredictionResponse.model_construct(
         predictions=predictions,
         total_tracks=len(predictions),
         average_confidence=avg_confidence
     )
 
 
+def _parse_feature_payload(body: bytes) -> np.ndarray:
+    """
+    Parse a raw request body straight into an (N, 10) float64 feature matrix
+
+    Accepts JSONL with one track object per line (or a JSON array of them), or
+    a columnar object mapping feature names to equal-length lists. Missing
+    features get the TrackData defaults. Raises ValueError for list-valued
+    keys that are not features and for null or non-finite values.
+    """
+    body = body.strip()
+    if not body:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=np.float64)
+
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        # More than one line, parse as JSONL
+        payload = None
+
+    if isinstance(payload, dict):
+        unknown = [k for k, v in payload.items() if isinstance(v, list) and k not in FEATURE_NAMES]
+        if unknown:
+            raise ValueError(f"Unexpected list-valued keys: {', '.join(unknown)}")
+
+    if isinstance(payload, dict) and any(isinstance(payload.get(name), list) for name in FEATURE_NAMES):
+        lengths = {len(payload[name]) for name in FEATURE_NAMES if isinstance(payload.get(name), list)}
+        if len(lengths) != 1:
+            raise ValueError("All feature columns must have the same length")
+        features_matrix = np.empty((lengths.pop(), len(FEATURE_NAMES)), dtype=np.float64)
+        for j, (name, default) in enumerate(zip(FEATURE_NAMES, FEATURE_DEFAULTS)):
+            features_matrix[:, j] = payload.get(name, default)
+    else:
+        if payload is None:
+            rows = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            rows = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Each JSONL line must be a track object")
+        features_matrix = np.array(
+            [[row.get(name, default) for name, default in zip(FEATURE_NAMES, FEATURE_DEFAULTS)] for row in rows],
+            dtype=np.float64
+        )
+
+    # null values become NaN, which the model cannot score
+    if not np.isfinite(features_matrix).all():
+        raise ValueError("Feature values must be finite numbers")
+    return features_matrix
+
+
+@app.post("/api/predict/jsonl")
+async def predict_genres_jsonl(request: Request):
+    """Bulk prediction for offline jobs, skipping per-track Pydantic models"""
+    if MODEL is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+
+    try:
+        features_matrix = _parse_feature_payload(await request.body())
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
+
+    if not len(features_matrix):
+        probabilities = np.empty((0, len(GENRE_LABELS)))
+    else:
+        try:
+            probabilities = await _run_inference(features_matrix)
+        except (ValueError, AttributeError) as e:
+            # Same errors the other endpoints treat as the model rejecting the input
+            logger.error("JSONL prediction error: %s", e)
+            raise HTTPException(status_code=503, detail=f"Loaded model cannot score these features: {e}")
+
+    return ORJSONResponse({
+        "genres": GENRE_LABELS,
+        "probabilities": probabilities,
+        "top_genres": [np.flatnonzero(row) for row in probabilities > 0.5],
+        "total_tracks": len(probabilities),
+        "model_version": "SVM-v2.0",
+        "timestamp": _NOW
+    })
+
+
 @app.get("/api/metrics")
 async def get_model_metrics():
     return {
@@ -268,6 +530,9 @@ async def get_model_metrics():
 
 
 if __name__ == "__main__":
+    # Development server (python -m backend.app.main), production runs
+    # under gunicorn (see gunicorn_config.py)
     import uvicorn
 
+    # loop/http default to "auto", which picks uvloop and httptools when installed
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
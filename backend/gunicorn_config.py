@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration for the Music Genre Classification API
+"""
+
+import os
+
+# Cores this process may run on, respecting cpuset and affinity limits
+ALLOWED_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", ALLOWED_CPUS))
+# UvicornWorker picks up uvloop and httptools automatically when installed
+worker_class = "uvicorn.workers.UvicornWorker"
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+
+# Import the app once in the master so workers share its memory after fork
+preload_app = True
+
+# Each worker is pinned to its own core, so it only needs one inference process
+os.environ.setdefault("INFERENCE_WORKERS", "1")
+
+
+def pre_fork(server, worker):
+    """Choose a core for the new worker in the master, preferring one no live worker holds"""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    load = {cpu: 0 for cpu in sorted(os.sched_getaffinity(0))}
+    for other in server.WORKERS.values():
+        if getattr(other, "cpu", None) in load:
+            load[other.cpu] += 1
+    # Replacements take over the core freed by the worker they replace
+    worker.cpu = min(load, key=load.get)
+
+
+def post_fork(server, worker):
+    """Pin the worker to the core chosen for it in pre_fork"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {worker.cpu})
+        server.log.info("Worker %s pinned to CPU %s", worker.pid, worker.cpu)